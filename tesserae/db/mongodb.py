@@ -80,6 +80,35 @@ def _extract_embedded_docs(doc):
     return result_keys, result_vals
 
 
+# Values that are treated as a degenerate (single-point) range in filters
+_SCALAR_RANGE_TYPES = (int, float, datetime.datetime)
+
+# Query operators for each (value kind, exclude) combination in a filter
+_FILTER_OPS = {
+    ('range', False): lambda v: {'$gte': v[0], '$lte': v[1]},
+    ('range', True): lambda v: {'$lt': v[0], '$gt': v[1]},
+    ('list', False): lambda v: {'$in': v},
+    ('list', True): lambda v: {'$nin': v},
+}
+
+
+def _normalize_filter_value(val):
+    """Classify a filter value and convert it to its query form
+
+    Returns
+    -------
+    kind : {'range', 'list'}
+        The key into ``_FILTER_OPS`` for this value.
+    converted : tuple or list
+        The sorted bounds of a range or the list of values to match.
+    """
+    if isinstance(val, _SCALAR_RANGE_TYPES):
+        return 'range', to_query_range(val, val)
+    if isinstance(val, tuple) and len(val) == 2:
+        return 'range', to_query_range(*val)
+    return 'list', to_query_list(val)
+
+
 def _dot_notate(doc):
     """Flatten embedded documents for MongoDB $set operation
     """
@@ -117,7 +146,7 @@ class TessMongoConnection():
         conn = conn[db]
         self.connection = conn
 
-    def aggregate(self, collection, pipeline, encode=True):
+    def aggregate(self, collection, pipeline, encode=True, batch_size=None):
         """Execute a MongoDB aggregation pipeline.
 
         Parameters
@@ -130,14 +159,22 @@ class TessMongoConnection():
             If True, encode the results as tesserae.db.entities.Entity
             instances. Set to False if `pipeline` will return documents that
             do not match any Entity.
+        batch_size : int, optional
+            The number of documents to fetch per round trip to the database.
+            Large result sets are retrieved with fewer round trips when this
+            is set above the server default.
 
         Returns
         -------
         entities : list of tesserae.db.entities.Entity or list of dict
             The documents returned from the database.
         """
+        kwargs = {}
+        if batch_size is not None:
+            kwargs['batchSize'] = batch_size
         result = self.connection[collection].aggregate(pipeline,
-                                                       allowDiskUse=True)
+                                                       allowDiskUse=True,
+                                                       **kwargs)
         if encode:
             entity = None
             if collection in tesserae.db.entities.entity_map:
@@ -147,13 +184,15 @@ class TessMongoConnection():
 
         return result
 
-    def find(self, collection, sort=None, **filter_values):
+    def find(self, collection, sort=None, batch_size=None, **filter_values):
         """Retrieve database entries.
 
         Parameters
         ----------
         collection : str
             The MongoDB collection to search.
+        batch_size : int, optional
+            The number of documents to fetch per round trip to the database.
         filter_values
             Keyword arguments with values to filter the database query.
 
@@ -164,7 +203,10 @@ class TessMongoConnection():
         """
         query_filter = self.create_filter(**filter_values)
         coll = self.connection[collection]
-        documents = coll.find(query_filter, sort=sort)
+        kwargs = {}
+        if batch_size is not None:
+            kwargs['batch_size'] = batch_size
+        documents = coll.find(query_filter, sort=sort, **kwargs)
 
         entity = None
         if collection in tesserae.db.entities.entity_map:
@@ -246,9 +288,13 @@ class TessMongoConnection():
         if not isinstance(entity, list):
             entity = [entity]
 
+        # Compute the unique values of each entity once; they are used both to
+        # find existing entries and to weed those entries out below.
+        unique_vals = [e.unique_values() for e in entity]
+
         filter_vals = {}
-        for e in entity:
-            for k, v in e.unique_values().items():
+        for vals in unique_vals:
+            for k, v in vals.items():
                 if k in filter_vals:
                     filter_vals[k].append(v)
                 else:
@@ -262,9 +308,8 @@ class TessMongoConnection():
         if len(exists) != 0:
             exists = [e.unique_values() for e in exists]
             new_ents = []
-            for e in entity:
-                if e.id is None or not any(
-                    [e.unique_values() == ex for ex in exists]):
+            for e, vals in zip(entity, unique_vals):
+                if e.id is None or not any(vals == ex for ex in exists):
                     new_ents.append(e)
             entity = new_ents
 
@@ -412,27 +457,8 @@ class TessMongoConnection():
                 if key not in query_filter:
                     query_filter[key] = {'$exists': True}
 
-                query = {}
-
-                if isinstance(val, (int, float, datetime.datetime)):
-                    val = to_query_range(val, val)
-                    if not exclude:
-                        query = {'$gte': val[0], '$lte': val[1]}
-                    else:
-                        query = {'$lt': val[0], '$gt': val[1]}
-                elif isinstance(val, tuple) and len(val) == 2:
-                    val = to_query_range(*val)
-                    if not exclude:
-                        query = {'$gte': val[0], '$lte': val[1]}
-                    else:
-                        query = {'$lt': val[0], '$gt': val[1]}
-                else:
-                    val = to_query_list(val)
-                    if not exclude:
-                        query = {'$in': val}
-                    else:
-                        query = {'$nin': val}
-                query_filter[key].update(query)
+                kind, val = _normalize_filter_value(val)
+                query_filter[key].update(_FILTER_OPS[(kind, exclude)](val))
 
         if len(query_filter) > 1:
             query_filter = {
@@ -481,8 +507,14 @@ class TessMongoConnection():
 
     def create_indices(self):
         """Creates indices for entities for faster lookup later"""
-        # index Unit entities by Text.id
-        self.connection[tesserae.db.entities.Unit.collection].create_index(
+        # index Unit entities by Text.id and unit type, since units are
+        # always retrieved for one kind of unit of a text
+        self.connection[tesserae.db.entities.Unit.collection].create_index([
+            ('text', pymongo.ASCENDING),
+            ('unit_type', pymongo.ASCENDING),
+        ])
+        # index Token entities by Text.id
+        self.connection[tesserae.db.entities.Token.collection].create_index(
             'text')
         # index Match entities by Search.id for faster search results retrieval
         self.connection[tesserae.db.entities.Match.collection].create_index([
@@ -493,7 +525,7 @@ class TessMongoConnection():
         self.connection[tesserae.db.entities.Search.collection].create_index(
             'results_id')
         # index Feature entities by language and feature type
-        self.connection[tesserae.db.entities.Search.collection].create_index([
+        self.connection[tesserae.db.entities.Feature.collection].create_index([
             ('language', pymongo.ASCENDING),
             ('feature', pymongo.ASCENDING),
         ])
@@ -620,27 +652,8 @@ def create_filter(**kwargs):
             if k not in f:
                 f[k] = {'$exists': True}
 
-            q = {}
-
-            if isinstance(v, (int, float, datetime.datetime)):
-                v = to_query_range(v, v)
-                if not exclude:
-                    q = {'$gte': v[0], '$lte': v[1]}
-                else:
-                    q = {'$lt': v[0], '$gt': v[1]}
-            elif isinstance(v, tuple) and len(v) == 2:
-                v = to_query_range(*v)
-                if not exclude:
-                    q = {'$gte': v[0], '$lte': v[1]}
-                else:
-                    q = {'$lt': v[0], '$gt': v[1]}
-            else:
-                v = to_query_list(v)
-                if not exclude:
-                    q = {'$in': v}
-                else:
-                    q = {'$nin': v}
-            f[k].update(q)
+            kind, v = _normalize_filter_value(v)
+            f[k].update(_FILTER_OPS[(kind, exclude)](v))
 
     if len(f) > 1:
         f = {'$and': [{k: v} for k, v in f.items()]}
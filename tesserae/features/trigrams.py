@@ -1,23 +1,12 @@
 import re
 
+_WORD_RE = re.compile(r'\w')
+
 
 def trigrammify(tokens):
-    pattern = re.compile(r'\w')
     token_grams = []
     for token in tokens:
-        grams = []
-        characters = []
-        for a in token:
-            char = pattern.match(a)
-            if char is not None:
-                char = char.group()
-                characters.append(char)
-        final = len(characters) - 1
-        if len(characters) < 3:
-            grams = []
-        else:
-            for a in range(final - 1):
-                grams.append(characters[a] + characters[a + 1] +
-                             characters[a + 2])
+        characters = ''.join(_WORD_RE.findall(token))
+        grams = [characters[a:a + 3] for a in range(len(characters) - 2)]
         token_grams.append(grams)
     return token_grams
@@ -1,4 +1,4 @@
-from collections import OrderedDict
+import heapq
 from operator import itemgetter
 import re
 
@@ -7,6 +7,11 @@ import pymongo
 
 from tesserae.db import Match
 
+_WORD_CHAR = re.compile(r'[\w]', flags=re.UNICODE)
+
+# documents fetched per round trip when reading whole texts from the database
+_FIND_BATCH_SIZE = 10000
+
 # TODO: implement probabilistic stem matching once that's worked out
 
 
@@ -132,41 +137,55 @@ class DefaultMatcher(object):
             self.retrieve_frequencies(texts, tokens,
                                       frequency_basis, stopwords)
 
-        print('Stopwords: {}'.format(stopwords))
-
         # TODO: recursive scheme for matching
 
         matches = []
+        freq_totals = []
+        dist_totals = []
         distance_function = self.span_distance if distance_metric == 'span' \
             else self.frequency_distance
 
+        # filter out punctuation and stopwords once per unit rather than once
+        # per pair of units
+        stopword_set = frozenset(stopwords)
+        units_b_tokens = [
+            _matchable_tokens(unit_b, tokens[1], stopword_set)
+            for unit_b in units[1]
+        ]
+
         for unit_a in units[0]:
-            for unit_b in units[1]:
-                match = Match(units=[unit_a, unit_b])
+            tokens_a = _matchable_tokens(unit_a, tokens[0], stopword_set)
+            # a unit without matchable tokens cannot match anything
+            if not tokens_a:
+                continue
+            # look up each source token's match method and index once rather
+            # than once per target token
+            tokens_a = [(t, t.match, t.index) for t in tokens_a]
+            for unit_b, tokens_b in zip(units[1], units_b_tokens):
+                if not tokens_b:
+                    continue
                 match_tokens = [[], []]
                 distance_vector = [[], []]
-                match_frequencies = [[], []]
-                tokens_a = [tokens[0][t] for t in unit_a.tokens]
-                tokens_b = [tokens[1][t] for t in unit_b.tokens]
-                for token_a in tokens_a:
-                    if not token_a.form or not re.search(r'[\w]', token_a.form, flags=re.UNICODE) or token_a.form in stopwords:
-                        continue
+                # the score numerator is accumulated as matches are found
+                inv_freq_total = 0.0
+                add_token_a = match_tokens[0].append
+                add_token_b = match_tokens[1].append
+                add_dist_a = distance_vector[0].append
+                add_dist_b = distance_vector[1].append
+                for token_a, token_a_match, index_a in tokens_a:
                     for token_b in tokens_b:
-                        if not token_b.form or not re.search(r'[\w]', token_b.form, flags=re.UNICODE) or token_b.form in stopwords:
-                            continue
-                        if token_a.match(token_b, feature):
-                            match_tokens[0].append(token_a)
-                            match_frequencies[0].append(frequencies[token_a.form])
-                            match_tokens[1].append(token_b)
-                            match_frequencies[1].append(frequencies[token_b.form])
+                        if token_a_match(token_b, feature):
+                            freq_a = frequencies[token_a.form]
+                            freq_b = frequencies[token_b.form]
+                            add_token_a(token_a)
+                            add_token_b(token_b)
+                            inv_freq_total += 1.0 / freq_a + 1.0 / freq_b
                             if distance_metric == 'span':
-                                distance_vector[0].append(token_a.index)
-                                distance_vector[1].append(token_b.index)
+                                add_dist_a(index_a)
+                                add_dist_b(token_b.index)
                             elif distance_metric == 'frequency':
-                                distance_vector[0].append(
-                                    (frequencies[token_a.form], token_a.index))
-                                distance_vector[1].append(
-                                    (frequencies[token_b.form], token_b.index))
+                                add_dist_a((freq_a, index_a))
+                                add_dist_b((freq_b, token_b.index))
 
                 if len(match_tokens[0]) < 2 or len(match_tokens[1]) < 2:
                     continue
@@ -174,13 +193,19 @@ class DefaultMatcher(object):
                 dist = distance_function(distance_vector).astype(np.float32)
 
                 if np.all(dist > 1) and np.all(dist <= max_distance):
-                    dist = sum(dist)
-                    freq = np.sum(
-                        np.sum(1.0 / np.asarray(match_frequencies).astype(np.float32), axis=-1))
-                    match.score = np.log(freq / dist)
+                    dist_totals.append(dist.sum())
+                    freq_totals.append(inv_freq_total)
+                    match = Match(units=[unit_a, unit_b])
                     match.match_tokens = match_tokens
                     matches.append(match)
 
+        # score every match with a single vectorized log
+        if matches:
+            scores = np.log(np.asarray(freq_totals, dtype=np.float64) /
+                            np.asarray(dist_totals, dtype=np.float64))
+            for match, score in zip(matches, scores.tolist()):
+                match.score = score
+
         self.matches.extend(matches)
         return matches
 
@@ -212,25 +237,25 @@ class DefaultMatcher(object):
         if basis == 'corpus':
             frequencies = self.connection.find(
                 'frequencies',
-                sort=[('frequency', pymongo.DESCENDING)])
+                sort=[('frequency', pymongo.DESCENDING)],
+                batch_size=_FIND_BATCH_SIZE)
         else:
             frequencies = self.connection.find(
                 'frequencies',
                 sort=[('frequency', pymongo.DESCENDING)],
+                batch_size=_FIND_BATCH_SIZE,
                 text=[t.path for t in texts])
 
-        formatted = OrderedDict()
+        formatted = {}
         for f in frequencies:
-            try:
-                formatted[f.form] += f.frequency
-            except KeyError:
-                formatted[f.form] = f.frequency
+            formatted[f.form] = formatted.get(f.form, 0) + f.frequency
 
         stopwords = []
         if stoplist:
-            stopwords = sorted(formatted.items(), key=lambda x: x[1], reverse=True)
-            stopwords = [i[0] for i in stopwords]
-            stopwords = stopwords[:stoplist]
+            stopwords = [
+                form for form, _ in heapq.nlargest(
+                    stoplist, formatted.items(), key=itemgetter(1))
+            ]
 
         return formatted, stopwords
 
@@ -253,6 +278,7 @@ class DefaultMatcher(object):
             tokens.append(self.connection.find(
                 'tokens',
                 sort=[('index', pymongo.ASCENDING)],
+                batch_size=_FIND_BATCH_SIZE,
                 text=text.path))
 
         return tokens
@@ -277,6 +303,7 @@ class DefaultMatcher(object):
         for text in texts:
             units.append(self.connection.find('units',
                          sort=[('index', pymongo.ASCENDING)],
+                         batch_size=_FIND_BATCH_SIZE,
                          text=text.path, unit_type=unit_type))
         return units
 
@@ -298,14 +325,9 @@ class DefaultMatcher(object):
         """
         index_vector = np.asarray(index_vector)
 
-        # Sort the indices of the match words in each unit.
-        ordered = np.argsort(index_vector, kind='heapsort', axis=-1)
-
         # The distance of the match in each unit is the number of words
         # spearating the first and last match words.
-        dist = np.abs(
-            np.take_along_axis(index_vector, ordered, axis=-1)[:, -1] -
-            np.take_along_axis(index_vector, ordered, axis=-1)[:, 0]) + 1
+        dist = np.ptp(index_vector, axis=-1) + 1
 
         # if np.any(dist < 2):
         #     raise ValueError(
@@ -313,3 +335,26 @@ class DefaultMatcher(object):
         #         "contain duplicate values")
 
         return dist
+
+
+def _matchable_tokens(unit, text_tokens, stopwords):
+    """Get the tokens of a unit that may take part in a match.
+
+    Parameters
+    ----------
+    unit : tesserae.db.Unit
+        The unit whose tokens should be retrieved.
+    text_tokens : list of tesserae.db.Token
+        All tokens of the text the unit belongs to.
+    stopwords : frozenset of str
+        Forms that should never be matched.
+
+    Returns
+    -------
+    tokens : list of tesserae.db.Token
+        The tokens of the unit with a word form that is not a stopword.
+    """
+    tokens = (text_tokens[t] for t in unit.tokens)
+    return [t for t in tokens
+            if t.form and t.form not in stopwords and
+            _WORD_CHAR.search(t.form)]
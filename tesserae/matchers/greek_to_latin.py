@@ -1,14 +1,16 @@
 """Match Greek units to Latin units"""
 from collections import defaultdict
+import itertools
 
 import numpy as np
-from scipy.sparse import csr_matrix
 
 from tesserae.data import load_greek_to_latin
-from tesserae.db.entities import Feature, Match
+from tesserae.db.entities import Feature
 from tesserae.matchers.sparse_encoding import \
-    _get_units, _inverse_averaged_freq_getter, _lookup_wrapper, \
-    gen_hits2positions, _get_distance_by_span, _get_distance_by_least_frequency
+    _extract_features_and_positions, _get_forms_array, \
+    _get_source_and_target_units, _inverse_averaged_freqs, _make_matches, \
+    _position_rows_to_csr, gen_hits2positions, _get_distance_by_span, \
+    _get_distance_by_least_frequency
 from tesserae.utils.calculations import \
     get_corpus_frequencies, get_feature_counts_by_text, \
     get_inverse_text_frequencies
@@ -170,10 +172,10 @@ class GreekToLatinSearch:
         assert target.text.language == 'latin'
         greek_stoplist_set = set(
             get_feature_indices(self.connection, 'greek', 'lemmata',
-                                greek_stopwords))
+                                greek_stopwords).tolist())
         latin_stoplist_set = set(
             get_feature_indices(self.connection, 'latin', 'lemmata',
-                                latin_stopwords))
+                                latin_stopwords).tolist())
         greek_features = self.connection.find(Feature.collection,
                                               language='greek',
                                               feature='lemmata')
@@ -182,42 +184,53 @@ class GreekToLatinSearch:
                                               language='latin',
                                               feature='lemmata')
         latin_features.sort(key=lambda x: x.index)
+        # features are indexed by position, so only their tokens are needed
+        greek_tokens = [f.token for f in greek_features]
+        latin_tokens = [f.token for f in latin_features]
         greek_ind_to_other_greek_inds = _build_greek_ind_to_other_greek_inds(
             self.connection, self.greek_to_latin)
         valid_latin_tokens_to_indices = {
             f.token: f.index
             for f in latin_features if f.index not in latin_stoplist_set
         }
+        greek_ind_to_latin_inds = _build_greek_ind_to_latin_inds(
+            greek_tokens, self.greek_to_latin, valid_latin_tokens_to_indices)
 
-        greek_units = _get_units(self.connection, source, 'lemmata')
-        latin_units = _get_units(self.connection, target, 'lemmata')
+        greek_units, latin_units = _get_source_and_target_units(
+            self.connection, source, target, 'lemmata')
 
         tag_helper = TagHelper(self.connection, [source.text, target.text])
 
-        greek_inv_frequencies_getter = _get_inv_greek_to_latin_freq_getter(
+        # inverse frequencies are looked up by indexing with form indices
+        greek_inv_freqs = _get_inv_greek_to_latin_freqs(
             self.connection, freq_basis, source, greek_units,
             greek_ind_to_other_greek_inds)
-        latin_inv_frequencies_getter = _get_inv_lemmata_freq_getter(
+        latin_inv_freqs = _get_inv_lemmata_freqs(
             self.connection, freq_basis, target, latin_units)
 
-        search_id = search.id
-
-        match_ents = []
-        numerator_sparse_rows = []
-        numerator_sparse_cols = []
-        numerator_sparse_data = []
+        candidates = []
+        numerator_data = []
+        numerator_breaks = [0]
         denominators = []
-        for greek_ind, latin_ind, positions in _gen_greek_to_latin_matches(
-                search, self.connection, greek_units, greek_features,
-                greek_stoplist_set, self.greek_to_latin,
-                valid_latin_tokens_to_indices, latin_units, latin_features,
+        greek_forms_cache = {}
+        latin_forms_cache = {}
+        for (greek_ind, latin_ind, greek_positions,
+             latin_positions) in _gen_greek_to_latin_matches(
+                search, self.connection, greek_units, greek_ind_to_latin_inds,
+                greek_stoplist_set, latin_units, latin_tokens,
                 latin_stoplist_set):
             greek_unit = greek_units[greek_ind]
             latin_unit = latin_units[latin_ind]
-            greek_forms = np.array(greek_unit['forms'])
-            latin_forms = np.array(latin_unit['forms'])
-            greek_positions = positions[:, 0]
-            latin_positions = positions[:, 1]
+            greek_forms = _get_forms_array(greek_units, greek_ind,
+                                           greek_forms_cache)
+            latin_forms = _get_forms_array(latin_units, latin_ind,
+                                           latin_forms_cache)
+            # fail on a form without an inverse frequency, as a dict lookup
+            # would, rather than scoring with NaN
+            greek_matched_inv_freqs = _lookup_inv_freqs(
+                greek_inv_freqs, greek_forms[np.unique(greek_positions)])
+            latin_matched_inv_freqs = _lookup_inv_freqs(
+                latin_inv_freqs, latin_forms[np.unique(latin_positions)])
             if distance_basis == 'span':
                 greek_distance = _get_distance_by_span(greek_positions,
                                                        greek_forms)
@@ -225,103 +238,138 @@ class GreekToLatinSearch:
                                                        latin_forms)
             else:
                 greek_distance = _get_distance_by_least_frequency(
-                    greek_inv_frequencies_getter, greek_positions, greek_forms)
+                    greek_inv_freqs, greek_positions, greek_forms)
                 latin_distance = _get_distance_by_least_frequency(
-                    latin_inv_frequencies_getter, latin_positions, latin_forms)
+                    latin_inv_freqs, latin_positions, latin_forms)
             if greek_distance <= 0 or latin_distance <= 0:
                 continue
             distance = greek_distance + latin_distance
             if distance <= max_distance:
-                matched_greek_to_latin_features = \
-                    _get_matched_greek_to_latin_features(
-                        greek_unit['features'], greek_positions,
-                        greek_features, self.greek_to_latin,
-                        valid_latin_tokens_to_indices
-                    )
-                matched_latin_features = [
-                    latin_unit['features'][latin_pos]
-                    for latin_pos in latin_positions
-                ]
                 match_features = _get_match_features(
-                    matched_greek_to_latin_features, matched_latin_features,
-                    latin_stoplist_set)
+                    greek_unit['features'], greek_positions,
+                    latin_unit['features'], latin_positions,
+                    greek_ind_to_latin_inds)
                 if match_features:
-                    match_inv_frequencies = [
-                        greek_inv_frequencies_getter(greek_forms[pos])
-                        for pos in set(greek_positions)
-                    ]
-                    match_inv_frequencies.extend([
-                        latin_inv_frequencies_getter(latin_forms[pos])
-                        for pos in set(latin_positions)
-                    ])
-                    numerator_sparse_rows.extend([len(match_ents)] *
-                                                 len(match_inv_frequencies))
-                    numerator_sparse_cols.extend(
-                        [i for i in range(len(match_inv_frequencies))])
-                    numerator_sparse_data.extend(match_inv_frequencies)
+                    numerator_data.extend(greek_matched_inv_freqs.tolist())
+                    numerator_data.extend(latin_matched_inv_freqs.tolist())
+                    numerator_breaks.append(len(numerator_data))
                     denominators.append(distance)
-                    match_ents.append(
-                        Match(search_id=search_id,
-                              source_unit=greek_unit['_id'],
-                              target_unit=latin_unit['_id'],
-                              source_tag=tag_helper.get_display_tag(
-                                  greek_unit['text'], greek_unit['tags']),
-                              target_tag=tag_helper.get_display_tag(
-                                  latin_unit['text'], latin_unit['tags']),
-                              matched_features=[
-                                  latin_features[int(mf)].token
-                                  for mf in match_features
-                              ],
-                              source_snippet=greek_unit['snippet'],
-                              target_snippet=latin_unit['snippet'],
-                              highlight=[(int(greek_pos), int(latin_pos))
-                                         for greek_pos, latin_pos in zip(
-                                             greek_positions, latin_positions)
-                                         ]))
-        if match_ents:
-            numerators = csr_matrix((numerator_sparse_data,
-                                     (numerator_sparse_rows,
-                                      numerator_sparse_cols))).sum(axis=-1).A1
-            scores = np.log(numerators) - np.log(denominators)
-            for match, score in zip(match_ents, scores):
-                match.score = score
-        return match_ents
-
-
-def _reverse_mapping(a2bs):
-    result = defaultdict(set)
-    for a, bs in a2bs.items():
-        for b in bs:
-            result[b].add(a)
-    return result
+                    candidates.append(
+                        (latin_unit, greek_unit, match_features,
+                         greek_positions, latin_positions))
+        # Greek-to-Latin results have never been filtered by min_score
+        return _make_matches(search.id, candidates, numerator_data,
+                             numerator_breaks, denominators, None,
+                             latin_features, tag_helper)
 
 
 def _build_greek_ind_to_other_greek_inds(conn, greek_to_latin):
-    greek_token_to_form = {
-        f.token: f
+    """Find the Greek forms that share a Latin translation with each other
+
+    Parameters
+    ----------
+    conn : TessMongoConnection
+    greek_to_latin : dict[str, list of str]
+        Latin translations of Greek lemmata
+
+    Returns
+    -------
+    indptr : 1d np.array of int
+        for the slice ``indptr[i]:indptr[i+1]``, those are the entries of
+        ``other_greek_inds`` that belong to the Greek form with index i
+    other_greek_inds : 1d np.array of int
+        indices of the other Greek forms sharing at least one Latin
+        translation with a given Greek form; a form is never listed as its
+        own neighbor, so sums over these entries do not double count it
+    """
+    greek_token_to_ind = {
+        f.token: f.index
         for f in conn.find(
             Feature.collection, language='greek', feature='form')
     }
-    latin_to_greek = _reverse_mapping(greek_to_latin)
-    result = defaultdict(set)
-    for greek_token, latin_translations in greek_to_latin.items():
-        if greek_token in greek_token_to_form:
-            other_greek_inds = set()
-            for latin_token in latin_translations:
-                for other_greek_token in latin_to_greek[latin_token]:
-                    if other_greek_token in greek_token_to_form:
-                        other_greek_inds.add(
-                            greek_token_to_form[other_greek_token].index)
-            result[greek_token_to_form[greek_token].index] = other_greek_inds
+    greek_ind_translations = [
+        (greek_token_to_ind[greek_token], latin_translations)
+        for greek_token, latin_translations in greek_to_latin.items()
+        if greek_token in greek_token_to_ind
+    ]
+    latin_to_greek_inds = defaultdict(list)
+    for greek_ind, latin_translations in greek_ind_translations:
+        for latin_token in latin_translations:
+            latin_to_greek_inds[latin_token].append(greek_ind)
+    greek_inds = []
+    other_greek_inds = []
+    for greek_ind, latin_translations in greek_ind_translations:
+        for latin_token in latin_translations:
+            others = latin_to_greek_inds[latin_token]
+            greek_inds.extend([greek_ind] * len(others))
+            other_greek_inds.extend(others)
+    # keep each (form, other form) pair once, and never pair a form with
+    # itself
+    edges = np.unique(
+        np.array([greek_inds, other_greek_inds], dtype=np.int64), axis=1)
+    edges = edges[:, edges[0] != edges[1]]
+    greek_forms_size = max(greek_token_to_ind.values(), default=-1) + 1
+    indptr = np.zeros(greek_forms_size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[0], minlength=greek_forms_size),
+              out=indptr[1:])
+    return indptr, edges[1]
+
+
+def _inv_freqs_to_array(inv_freqs):
+    """Lay out inverse frequencies keyed by form index in a dense array
+
+    Parameters
+    ----------
+    inv_freqs : dict [int, float]
+        inverse frequency of every form index that may be looked up
+
+    Returns
+    -------
+    1d np.array of float
+        the value at index i is the inverse frequency of the form with index
+        i, or NaN if ``inv_freqs`` has no entry for it
+    """
+    result = np.full(max(inv_freqs) + 1 if inv_freqs else 0, np.nan)
+    result[list(inv_freqs.keys())] = list(inv_freqs.values())
     return result
 
 
-def _get_inv_lemmata_freq_getter(conn, freq_basis, text_options, latin_units):
+def _lookup_inv_freqs(inv_freqs, forms):
+    """Gather the inverse frequencies of some forms
+
+    Parameters
+    ----------
+    inv_freqs : 1d np.array of float
+        as returned by ``_inv_freqs_to_array()``
+    forms : 1d np.array of int
+        form indices to look up; every form looked up here has features, so
+        a NaN in ``inv_freqs`` can only mark a missing entry
+
+    Returns
+    -------
+    1d np.array of float
+        the inverse frequency of each form in ``forms``
+
+    Raises
+    ------
+    KeyError
+        if a form index is negative or has no inverse frequency
+    """
+    missing = (forms < 0) | (forms >= len(inv_freqs))
+    if not missing.any():
+        result = inv_freqs[forms]
+        missing = np.isnan(result)
+        if not missing.any():
+            return result
+    raise KeyError(int(forms[np.argmax(missing)]))
+
+
+def _get_inv_lemmata_freqs(conn, freq_basis, text_options, latin_units):
     if freq_basis != 'texts':
-        return _inverse_averaged_freq_getter(
+        return _inv_freqs_to_array(_inverse_averaged_freqs(
             get_corpus_frequencies(conn, 'lemmata',
-                                   text_options.text.language), latin_units)
-    return _lookup_wrapper(
+                                   text_options.text.language), latin_units))
+    return _inv_freqs_to_array(
         get_inverse_text_frequencies(conn, 'lemmata', text_options.text.id))
 
 
@@ -329,115 +377,133 @@ def _get_greek_to_latin_inv_freqs_by_text(conn, text_options, text_length,
                                           greek_ind_to_other_greek_inds):
     greek_lemma_counts = get_feature_counts_by_text(conn, 'lemmata',
                                                     text_options.text)
-    result = {}
-    for greek_form_ind, greek_counts in greek_lemma_counts.items():
-        already_seen = set([greek_form_ind])
-        value = greek_counts
-        for other_greek_ind in greek_ind_to_other_greek_inds[greek_form_ind]:
-            if other_greek_ind in already_seen:
-                continue
-            value += greek_lemma_counts[other_greek_ind]
-            already_seen.add(other_greek_ind)
-        if value > 0:
-            result[greek_form_ind] = float(text_length) / float(value)
-    return result
-
-
-def _get_inv_greek_to_latin_freq_getter(conn, freq_basis, text_options,
-                                        greek_units,
-                                        greek_ind_to_other_greek_inds):
+    if not greek_lemma_counts:
+        return {}
+    indptr, other_greek_inds = greek_ind_to_other_greek_inds
+    form_inds = np.fromiter(greek_lemma_counts.keys(), dtype=np.int64,
+                            count=len(greek_lemma_counts))
+    counts = np.fromiter(greek_lemma_counts.values(), dtype=np.float64,
+                         count=len(greek_lemma_counts))
+    forms_size = max(len(indptr) - 1, int(form_inds.max()) + 1)
+    counts_by_form = np.zeros(forms_size)
+    counts_by_form[form_inds] = counts
+    # segmented sum of the counts of every form's neighbors; forms that do
+    # not occur in the text contribute nothing
+    neighbor_rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    neighbor_counts = np.bincount(neighbor_rows,
+                                  weights=counts_by_form[other_greek_inds],
+                                  minlength=forms_size)
+    totals = counts + neighbor_counts[form_inds]
+    found = totals > 0
+    return dict(zip(form_inds[found].tolist(),
+                    (float(text_length) / totals[found]).tolist()))
+
+
+def _get_inv_greek_to_latin_freqs(conn, freq_basis, text_options, greek_units,
+                                  greek_ind_to_other_greek_inds):
     if freq_basis != 'texts':
-        return _inverse_averaged_freq_getter(
+        return _inv_freqs_to_array(_inverse_averaged_freqs(
             get_corpus_frequencies(conn, 'lemmata',
-                                   text_options.text.language), greek_units)
+                                   text_options.text.language), greek_units))
     # otherwise, handle text case
     text_length = sum(len(u['forms']) for u in greek_units)
-    return _lookup_wrapper(
+    return _inv_freqs_to_array(
         _get_greek_to_latin_inv_freqs_by_text(conn, text_options, text_length,
                                               greek_ind_to_other_greek_inds))
 
 
-def make_latinized_greek_matrix(greek_units, greek_features,
-                                greek_stoplist_set, greek_to_latin,
-                                valid_latin_tokens_to_indices,
-                                latin_features_size):
-    latin_feature_inds = []
-    pos_inds = []
-    break_inds = [0]
-    for unit in greek_units:
-        end_break_inds = break_inds[-1]
-        cur_features = unit['features']
-        for i, features in enumerate(cur_features):
-            valid_greek_features = [
-                f for f in features if f not in greek_stoplist_set and f >= 0
-            ]
-            translated_tokens = [
-                greek_to_latin[greek_features[f].token]
-                for f in valid_greek_features
-                if greek_features[f].token in greek_to_latin
-            ]
-            valid_latin_features = [
-                valid_latin_tokens_to_indices[latin_token]
-                for translations in translated_tokens
-                for latin_token in translations
-                if latin_token in valid_latin_tokens_to_indices
-            ]
-            latin_feature_inds.extend(valid_latin_features)
-            pos_inds.extend([end_break_inds + i] * len(valid_latin_features))
-        break_inds.append(end_break_inds + len(cur_features))
-    return (csr_matrix(
-        (np.ones(len(pos_inds), dtype=np.bool),
-         (pos_inds, latin_feature_inds)),
-        shape=(break_inds[-1], latin_features_size)), np.array(break_inds))
-
-
-def _gen_greek_to_latin_matches(search, conn, greek_units, greek_features,
-                                greek_stoplist_set, greek_to_latin,
-                                valid_latin_tokens_to_indices, latin_units,
-                                latin_features, latin_stoplist_set):
+def make_latinized_greek_matrix(greek_units, greek_ind_to_latin_inds,
+                                greek_stoplist_set, latin_features_size):
+    # stopwords are dropped with a mask below rather than by _extract's isin
+    greek_feature_inds, greek_pos_inds, break_inds = \
+        _extract_features_and_positions(greek_units, ())
+    # pack the translations so that every Greek feature occurrence can be
+    # expanded into its Latin feature indices with array operations
+    translation_counts = np.fromiter(
+        (len(latin_inds) for latin_inds in greek_ind_to_latin_inds),
+        dtype=np.int32, count=len(greek_ind_to_latin_inds))
+    translation_starts = np.zeros(len(translation_counts), dtype=np.int32)
+    np.cumsum(translation_counts[:-1], out=translation_starts[1:])
+    translations = np.fromiter(
+        itertools.chain.from_iterable(greek_ind_to_latin_inds),
+        dtype=np.int32, count=int(translation_counts.sum()))
+    greek_stoplist_mask = np.zeros(len(translation_counts), dtype=np.bool_)
+    greek_stoplist_mask[list(greek_stoplist_set)] = True
+
+    # a Greek stopword expands into no Latin features at all
+    counts = np.where(greek_stoplist_mask[greek_feature_inds], 0,
+                      translation_counts[greek_feature_inds])
+    pos_inds = np.repeat(greek_pos_inds, counts)
+    offsets = np.arange(len(pos_inds), dtype=np.int32) - np.repeat(
+        np.cumsum(counts, dtype=np.int32) - counts, counts)
+    latin_feature_inds = translations[
+        np.repeat(translation_starts[greek_feature_inds], counts) + offsets]
+    return (_position_rows_to_csr(pos_inds, latin_feature_inds,
+                                  (break_inds[-1], latin_features_size)),
+            break_inds)
+
+
+def _gen_greek_to_latin_matches(search, conn, greek_units,
+                                greek_ind_to_latin_inds, greek_stoplist_set,
+                                latin_units, latin_tokens,
+                                latin_stoplist_set):
     latinized_greek_matrix, greek_break_inds = make_latinized_greek_matrix(
-        greek_units, greek_features, greek_stoplist_set, greek_to_latin,
-        valid_latin_tokens_to_indices, len(latin_features))
+        greek_units, greek_ind_to_latin_inds, greek_stoplist_set,
+        len(latin_tokens))
 
     for hits2positions in gen_hits2positions(search, conn,
                                              latinized_greek_matrix,
                                              greek_break_inds, latin_units,
                                              latin_stoplist_set,
-                                             len(latin_features)):
-        overhits2positions = {
-            k: np.array(v)
-            for k, v in hits2positions.items() if len(v) >= 2
-        }
-        for (t_ind, s_ind), positions in overhits2positions.items():
-            yield (t_ind, s_ind, positions)
-
-
-def _get_matched_greek_to_latin_features(greek_unit_features, greek_positions,
-                                         greek_features, greek_to_latin,
-                                         valid_latin_tokens_to_indices):
-    result = []
-    for greek_pos in greek_positions:
-        greek_features_by_pos = greek_unit_features[greek_pos]
-        cur_pos_latin_features = []
-        for greek_feature_index in greek_features_by_pos:
-            greek_token = greek_features[greek_feature_index].token
-            if greek_token in greek_to_latin:
-                translations = greek_to_latin[greek_token]
-                for latin_token in translations:
-                    if latin_token in valid_latin_tokens_to_indices:
-                        cur_pos_latin_features.append(
-                            valid_latin_tokens_to_indices[latin_token])
-        result.append(cur_pos_latin_features)
-    return result
-
-
-def _get_match_features(matched_greek_to_latin_features,
-                        matched_latin_features, latin_stoplist_set):
-    result = set()
-    for features_by_pos1, features_by_pos2 in \
-            zip(matched_greek_to_latin_features, matched_latin_features):
-        features_in_both = set(features_by_pos1).intersection(
-            set(features_by_pos2))
-        for feature in features_in_both:
-            result.add(feature)
-    return result - latin_stoplist_set
+                                             len(latin_tokens)):
+        # hits2positions only holds unit pairs with at least two hits, each
+        # already as an array
+        for (t_ind, s_ind), positions in hits2positions.items():
+            # split the columns into contiguous arrays with a single copy
+            greek_positions, latin_positions = np.ascontiguousarray(
+                positions.T)
+            yield (t_ind, s_ind, greek_positions, latin_positions)
+
+
+def _build_greek_ind_to_latin_inds(greek_tokens, greek_to_latin,
+                                   valid_latin_tokens_to_indices):
+    """Translate every Greek feature into Latin feature indices up front
+
+    Parameters
+    ----------
+    greek_tokens : list of str
+        the tokens of the Greek lemmata features, ordered by feature index
+    greek_to_latin : dict[str, list of str]
+        Latin translations of Greek lemmata
+    valid_latin_tokens_to_indices : dict[str, int]
+        feature indices of the Latin lemmata that may be matched
+
+    Returns
+    -------
+    list of tuple of int
+        the Latin feature indices that the Greek feature with a given index
+        translates to; empty if it has no usable translation
+    """
+    return [
+        tuple(valid_latin_tokens_to_indices[latin_token]
+              for latin_token in greek_to_latin.get(greek_token, ())
+              if latin_token in valid_latin_tokens_to_indices)
+        for greek_token in greek_tokens
+    ]
+
+
+def _get_match_features(greek_unit_features, greek_positions,
+                        latin_unit_features, latin_positions,
+                        greek_ind_to_latin_inds):
+    # a position only has a handful of features, so scanning the Latin
+    # features for each translation beats building a set per position;
+    # Latin stopwords never appear among the translations, so nothing needs
+    # to be filtered out afterwards
+    return {
+        latin_ind
+        for greek_pos, latin_pos in zip(greek_positions.tolist(),
+                                        latin_positions.tolist())
+        for greek_feature_index in greek_unit_features[greek_pos]
+        for latin_ind in greek_ind_to_latin_inds[greek_feature_index]
+        if latin_ind in latin_unit_features[latin_pos]
+    }
@@ -4,6 +4,8 @@ Classes
 -------
 
 """
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import itertools
 
 import numpy as np
@@ -13,7 +15,10 @@ from tesserae.db.entities import Feature, Match, Unit
 from tesserae.utils.calculations import \
     get_corpus_frequencies, get_inverse_text_frequencies, get_sound_inverse_text_freq
 from tesserae.utils.retrieve import TagHelper
-from tesserae.utils.stopwords import create_stoplist, get_stoplist_indices, get_stoplist_tokens
+from tesserae.utils.stopwords import create_stoplist, get_stoplist_indices
+
+# units fetched per round trip when aggregating a text's units
+_UNIT_BATCH_SIZE = 1000
 
 
 class SparseMatrixSearch(object):
@@ -206,27 +211,23 @@ class SparseMatrixSearch(object):
                              f'"{source.text.language}" '
                              f'was not found in the database.')
 
-        target_units = _get_units(self.connection, target, feature)
-        source_units = _get_units(self.connection, source, feature)
+        source_units, target_units = _get_source_and_target_units(
+            self.connection, source, target, feature)
 
         tag_helper = TagHelper(self.connection, texts)
 
         if freq_basis != 'texts':
-            match_ents = _score_by_corpus_frequencies(search, self.connection,
-                                                      score_basis, texts,
-                                                      target_units,
-                                                      source_units, features,
-                                                      stoplist, distance_basis,
-                                                      max_distance, tag_helper)
-        else:
-            match_ents = _score_by_text_frequencies(search, self.connection,
-                                                    score_basis, texts,
-                                                    target_units, source_units,
-                                                    features, stoplist,
-                                                    distance_basis,
-                                                    max_distance, tag_helper)
-
-        return [m for m in match_ents if m.score >= min_score]
+            return _score_by_corpus_frequencies(search, self.connection,
+                                                score_basis, texts,
+                                                target_units, source_units,
+                                                features, stoplist,
+                                                distance_basis, max_distance,
+                                                tag_helper, min_score)
+        return _score_by_text_frequencies(search, self.connection,
+                                          score_basis, texts, target_units,
+                                          source_units, features, stoplist,
+                                          distance_basis, max_distance,
+                                          tag_helper, min_score)
 
 
 def _get_units(connection, textoptions, feature):
@@ -244,7 +245,6 @@ def _get_units(connection, textoptions, feature):
                     '$project': {
                         '_id': True,
                         'text': True,
-                        'index': True,
                         'snippet': True,
                         'tags': True,
                         'forms': {
@@ -262,71 +262,82 @@ def _get_units(connection, textoptions, feature):
                     }
                 }
             ],
-            encode=False)
+            encode=False,
+            batch_size=_UNIT_BATCH_SIZE)
     ]
 
 
+def _get_source_and_target_units(connection, source, target, feature):
+    """Retrieve the units of the source and target texts concurrently
+
+    The two aggregations are independent and mostly spend their time waiting
+    on the database, so the target units are fetched on a second thread while
+    the source units are fetched on this one.
+
+    Parameters
+    ----------
+    connection : TessMongoConnection
+    source : tesserae.matchers.text_options.TextOptions
+    target : tesserae.matchers.text_options.TextOptions
+    feature : str
+        the feature whose indices should be retrieved for each token
+
+    Returns
+    -------
+    source_units : list of dict
+    target_units : list of dict
+        see ``_get_units()`` for details
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        target_future = executor.submit(_get_units, connection, target,
+                                        feature)
+        source_units = _get_units(connection, source, feature)
+        return source_units, target_future.result()
+
+
 def _score_by_corpus_frequencies(search, connection, score_basis, texts,
                                  target_units, source_units, features,
                                  stoplist, distance_basis, max_distance,
-                                 tag_helper):
-    if score_basis == 'sound':
-        if texts[0].language != texts[1].language:
-            source_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[0].language),
-                source_units)
-            target_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[1].language),
-                target_units)
-        else:
-            source_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[0].language),
-                itertools.chain.from_iterable([source_units, target_units]))
-            target_inv_frequencies_getter = source_inv_frequencies_getter
-        return _score_sound(search, connection, target_units, source_units, features,
-                    stoplist, distance_basis, max_distance,
-                    source_inv_frequencies_getter, target_inv_frequencies_getter,
-                    tag_helper)
+                                 tag_helper, min_score):
+    if texts[0].language != texts[1].language:
+        source_inv_frequencies_getter = _inverse_averaged_freq_getter(
+            get_corpus_frequencies(connection, score_basis, texts[0].language),
+            source_units)
+        target_inv_frequencies_getter = _inverse_averaged_freq_getter(
+            get_corpus_frequencies(connection, score_basis, texts[1].language),
+            target_units)
     else:
-        if texts[0].language != texts[1].language:
-            source_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[0].language),
-                source_units)
-            target_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[1].language),
-                target_units)
-        else:
-            source_inv_frequencies_getter = _inverse_averaged_freq_getter(
-                get_corpus_frequencies(connection, score_basis, texts[0].language),
-                itertools.chain.from_iterable([source_units, target_units]))
-            target_inv_frequencies_getter = source_inv_frequencies_getter
-        return _score(search, connection, target_units, source_units, features,
-                    stoplist, distance_basis, max_distance,
-                    source_inv_frequencies_getter, target_inv_frequencies_getter,
-                    tag_helper)
+        source_inv_frequencies_getter = _inverse_averaged_freq_getter(
+            get_corpus_frequencies(connection, score_basis, texts[0].language),
+            itertools.chain.from_iterable([source_units, target_units]))
+        target_inv_frequencies_getter = source_inv_frequencies_getter
+    score = _score_sound if score_basis == 'sound' else _score
+    return score(search, connection, target_units, source_units, features,
+                 stoplist, distance_basis, max_distance,
+                 source_inv_frequencies_getter, target_inv_frequencies_getter,
+                 tag_helper, min_score)
 
 
 def _score_by_text_frequencies(search, connection, score_basis, texts,
                                target_units, source_units, features, stoplist,
-                               distance_basis, max_distance, tag_helper):
+                               distance_basis, max_distance, tag_helper,
+                               min_score):
     if score_basis == 'sound':
         source_inv_frequencies_getter = _lookup_wrapper(
             get_sound_inverse_text_freq(connection, texts[0].id))
         target_inv_frequencies_getter = _lookup_wrapper(
             get_sound_inverse_text_freq(connection, texts[1].id))
-        return _score_sound(search, connection, target_units, source_units, features,
-                    stoplist, distance_basis, max_distance,
-                    source_inv_frequencies_getter, target_inv_frequencies_getter,
-                    tag_helper)
+        score = _score_sound
     else:
         source_inv_frequencies_getter = _lookup_wrapper(
             get_inverse_text_frequencies(connection, score_basis, texts[0].id))
         target_inv_frequencies_getter = _lookup_wrapper(
             get_inverse_text_frequencies(connection, score_basis, texts[1].id))
-        return _score(search, connection, target_units, source_units, features,
-                    stoplist, distance_basis, max_distance,
-                    source_inv_frequencies_getter, target_inv_frequencies_getter,
-                    tag_helper)
+        score = _score
+    return score(search, connection, target_units, source_units, features,
+                 stoplist, distance_basis, max_distance,
+                 source_inv_frequencies_getter, target_inv_frequencies_getter,
+                 tag_helper, min_score)
 
 
 def _get_trivial_distance(p0, p1):
@@ -342,6 +353,22 @@ def _get_trivial_distance(p0, p1):
     return abs(p0 - p1) + 1
 
 
+def _has_distinct_forms(positions, forms):
+    """Tell whether at least two different forms sit at the positions
+
+    Parameters
+    ----------
+    positions : 1d np.array of ints
+        token positions in the unit where matches were found
+    forms : 1d np.array of ints
+        the token forms of the unit
+    """
+    if len(positions) < 2:
+        return False
+    matched_forms = forms[positions]
+    return bool((matched_forms != matched_forms[0]).any())
+
+
 def _get_distance_by_least_frequency(get_inv_freq, positions, forms):
     """Obtains the distance by least frequency for a unit
 
@@ -353,29 +380,33 @@ def _get_distance_by_least_frequency(get_inv_freq, positions, forms):
 
     Parameters
     ----------
-    get_inv_freq : (int) -> float
+    get_inv_freq : (int) -> float or 1d np.array of floats
         a function that takes a word form index as input and returns its
-        inverse frequency as output
+        inverse frequency as output, or an array holding the inverse
+        frequency of every word form index
     positions : 1d np.array of ints
         token positions in the unit where matches were found
     forms : 1d np.array of ints
         the token forms of the unit
     """
-    if len(set(forms[positions])) < 2:
+    if not _has_distinct_forms(positions, forms):
         return 0
     if len(positions) == 2:
         return _get_trivial_distance(positions[0], positions[1])
-    sorted_positions = np.array(sorted(positions))
-    inv_freqs = np.array([get_inv_freq(f) for f in forms[sorted_positions]])
-    # lowest inverse frequencies are the highest frequencies, so need to flip
-    freq_sort = np.argsort(-inv_freqs)
-    idx = sorted_positions[freq_sort]
-    if idx.shape[0] >= 2:
-        not_first_pos = idx[idx != idx[0]]
-        if not_first_pos.shape[0] > 0:
-            end = not_first_pos[0]
-            return np.abs(end - idx[0]) + 1
-    return 0
+    sorted_positions = np.sort(positions)
+    if isinstance(get_inv_freq, np.ndarray):
+        inv_freqs = get_inv_freq[forms[sorted_positions]]
+    else:
+        inv_freqs = np.array(
+            [get_inv_freq(f) for f in forms[sorted_positions]])
+    # only the two rarest words matter, so there is no need for a full sort;
+    # ties deliberately go to the earliest position, which argmax returns
+    start = sorted_positions[np.argmax(inv_freqs)]
+    others = sorted_positions != start
+    if not others.any():
+        return 0
+    end = sorted_positions[np.argmax(np.where(others, inv_freqs, -np.inf))]
+    return abs(int(end) - int(start)) + 1
 
 
 def _get_distance_by_span(matched_positions, forms):
@@ -388,18 +419,42 @@ def _get_distance_by_span(matched_positions, forms):
     forms : 1d np.array of ints
         the token forms of the unit
     """
-    if len(set(forms[matched_positions])) < 2:
+    if not _has_distinct_forms(matched_positions, forms):
         return 0
     if len(matched_positions) == 2:
         return _get_trivial_distance(matched_positions[0],
                                      matched_positions[1])
-    start_pos = np.min(matched_positions)
-    end_pos = np.max(matched_positions)
-    if start_pos != end_pos:
-        return np.abs(end_pos - start_pos) + 1
+    span = np.ptp(matched_positions)
+    if span:
+        return span + 1
     return 0
 
 
+def _compute_scores(numerator_data, numerator_breaks, denominators):
+    """Score all matches at once
+
+    Parameters
+    ----------
+    numerator_data : list of float
+        the inverse frequencies of the matched words of every match, laid out
+        end to end
+    numerator_breaks : list of int
+        for the slice ``numerator_breaks[i]:numerator_breaks[i+1]``, those are
+        the inverse frequencies in ``numerator_data`` that belong to match i;
+        every match must have at least one inverse frequency
+    denominators : list of int
+        the distance of each match
+
+    Returns
+    -------
+    1d np.array of float
+        the score of each match
+    """
+    numerators = np.add.reduceat(np.asarray(numerator_data, dtype=np.float64),
+                                 numerator_breaks[:-1])
+    return np.log(numerators) - np.log(denominators)
+
+
 def _lookup_wrapper(d):
     """Useful for making dictionaries act like functions"""
     def _inner(key):
@@ -408,18 +463,29 @@ def _lookup_wrapper(d):
     return _inner
 
 
-def _inverse_averaged_freq_getter(d, units_iter):
+def _inverse_averaged_freqs(d, units_iter):
+    """Map every form in the units to the inverse of its features' averaged
+    frequency"""
     cache = {}
     for unit in units_iter:
         for form, feats in zip(unit['forms'], unit['features']):
             if form in cache:
                 continue
-            cache[form] = 1.0 / np.mean([d[f] for f in feats])
+            # the reciprocal of the mean, without a numpy call per form; as
+            # with 1.0 / np.mean(...), no features gives NaN and features
+            # that never occur give inf
+            total = float(sum(d[f] for f in feats))
+            if not feats:
+                cache[form] = np.nan
+            elif not total:
+                cache[form] = np.inf
+            else:
+                cache[form] = len(feats) / total
+    return cache
 
-    def _inner(key):
-        return cache[key]
 
-    return _inner
+def _inverse_averaged_freq_getter(d, units_iter):
+    return _lookup_wrapper(_inverse_averaged_freqs(d, units_iter))
 
 
 def _extract_features_and_positions(units, stoplist_set):
@@ -458,22 +524,21 @@ def _extract_features_and_positions(units, stoplist_set):
     >>> break_inds == np.array([0, 1, 3])
 
     """
-    feature_inds = []
-    pos_inds = []
-    break_inds = [0]
-    for unit in units:
-        end_break_inds = break_inds[-1]
-        cur_features = unit['features']
-        for i, features in enumerate(cur_features):
-            valid_features = [
-                f for f in features if f not in stoplist_set and f >= 0
-            ]
-            if -1 in valid_features:
-                print(unit)
-            feature_inds.extend(valid_features)
-            pos_inds.extend([end_break_inds + i] * len(valid_features))
-        break_inds.append(end_break_inds + len(cur_features))
-    return np.array(feature_inds), np.array(pos_inds), np.array(break_inds)
+    unit_lengths = [len(unit['features']) for unit in units]
+    position_features = list(
+        itertools.chain.from_iterable(unit['features'] for unit in units))
+    # scipy stores sparse matrix indices as int32, so build them that way
+    break_inds = np.zeros(len(unit_lengths) + 1, dtype=np.int32)
+    np.cumsum(unit_lengths, out=break_inds[1:])
+    feature_inds = np.fromiter(
+        itertools.chain.from_iterable(position_features), dtype=np.int32)
+    pos_inds = np.repeat(
+        np.arange(len(position_features), dtype=np.int32),
+        [len(features) for features in position_features])
+    keep = feature_inds >= 0
+    if stoplist_set:
+        keep &= ~np.isin(feature_inds, list(stoplist_set))
+    return feature_inds[keep], pos_inds[keep], break_inds
 
 
 def _construct_feature_unit_matrix(units, stoplist_set, features_size):
@@ -502,11 +567,10 @@ def _construct_feature_unit_matrix(units, stoplist_set, features_size):
     """
     feature_inds, pos_inds, break_inds = _extract_features_and_positions(
         units, stoplist_set)
-    for sw in stoplist_set:
-        if np.any(feature_inds == sw):
-            raise Exception('Stopword in Feature x Unit Matrix!')
+    if stoplist_set and np.isin(feature_inds, list(stoplist_set)).any():
+        raise Exception('Stopword in Feature x Unit Matrix!')
     return (csr_matrix(
-        (np.ones(len(pos_inds), dtype=np.bool), (feature_inds, pos_inds)),
+        (np.ones(len(pos_inds), dtype=np.bool_), (feature_inds, pos_inds)),
         shape=(features_size, break_inds[-1])), break_inds)
 
 
@@ -536,12 +600,63 @@ def _construct_unit_feature_matrix(units, stoplist_set, features_size):
     """
     feature_inds, pos_inds, break_inds = _extract_features_and_positions(
         units, stoplist_set)
-    for sw in stoplist_set:
-        if np.any(feature_inds == sw):
-            raise Exception('Stopword in Unit x Feature Matrix!')
-    return (csr_matrix(
-        (np.ones(len(pos_inds), dtype=np.bool), (pos_inds, feature_inds)),
-        shape=(break_inds[-1], features_size)), break_inds)
+    if stoplist_set and np.isin(feature_inds, list(stoplist_set)).any():
+        raise Exception('Stopword in Unit x Feature Matrix!')
+    return (_position_rows_to_csr(pos_inds, feature_inds,
+                                  (break_inds[-1], features_size)),
+            break_inds)
+
+
+def _position_rows_to_csr(pos_inds, col_inds, shape):
+    """Build a boolean matrix whose rows are positions without going
+    through COO format
+
+    Parameters
+    ----------
+    pos_inds : 1d np.array of int
+        row index of every entry; must already be in ascending order, as
+        returned by ``_extract_features_and_positions()``
+    col_inds : 1d np.array of int
+        column index of every entry
+    shape : (int, int)
+        shape of the resulting matrix
+
+    Returns
+    -------
+    csr_matrix
+        ``M[pos_inds[i], col_inds[i]] == True`` for every i
+
+    """
+    indptr = np.searchsorted(pos_inds, np.arange(shape[0] + 1))
+    m = csr_matrix(
+        (np.ones(len(col_inds), dtype=np.bool_), col_inds, indptr),
+        shape=shape)
+    # put the matrix in canonical form, as the COO conversion did, so that
+    # products emit their hits in the same order
+    m.sum_duplicates()
+    return m
+
+
+def _positions_to_unit_indices(breaks):
+    """Map every position to the index of the unit it belongs to
+
+    Parameters
+    ----------
+    breaks : 1d np.array of ints
+        see ``_extract_features_and_positions()`` for details
+
+    Returns
+    -------
+    1d np.array of ints
+        the value at index i is the index of the unit containing position i
+
+    Example
+    -------
+    >>> _positions_to_unit_indices(np.array([0, 2, 3, 3, 5]))
+    array([0, 0, 1, 3, 3])
+
+    """
+    return np.repeat(np.arange(len(breaks) - 1), np.diff(breaks))
 
 
 def _bin_hits_to_unit_indices(rows, cols, row2t_unit_ind, target_breaks,
@@ -598,12 +713,7 @@ def _bin_hits_to_unit_indices(rows, cols, row2t_unit_ind, target_breaks,
     """
     # keep track of mapping between matrix column index and source unit index
     # in ``source_units``
-    col2s_unit_ind = np.array([
-        u_ind for u_ind in range(len(source_breaks) - 1)
-        for _ in range(source_breaks[u_ind + 1] - source_breaks[u_ind])
-    ])
-    tmp = {}
-    hits2positions = {}
+    col2s_unit_ind = _positions_to_unit_indices(source_breaks)
     t_inds = row2t_unit_ind[rows]
     s_inds = col2s_unit_ind[cols]
     t_poses = rows - target_breaks[t_inds]
@@ -612,15 +722,26 @@ def _bin_hits_to_unit_indices(rows, cols, row2t_unit_ind, target_breaks,
     # batch of source_units, s_inds needs to account for source_unit indices as
     # referenced from outside of this batch
     s_inds += su_start
-    for t_ind, s_ind, t_pos, s_pos in zip(t_inds, s_inds, t_poses, s_poses):
-        key = (t_ind, s_ind)
-        if key not in tmp:
-            tmp[key] = (t_pos, s_pos)
-        elif key not in hits2positions:
-            hits2positions[key] = [tmp[key], (t_pos, s_pos)]
-        else:
-            hits2positions[key].append((t_pos, s_pos))
-    hits2positions = {k: np.array(v) for k, v in hits2positions.items()}
+    # group the hits by unit pair; lexsort is stable, so hits within a pair
+    # keep their original order
+    order = np.lexsort((s_inds, t_inds))
+    t_sorted = t_inds[order]
+    s_sorted = s_inds[order]
+    starts = np.flatnonzero(
+        np.concatenate(([True], (t_sorted[1:] != t_sorted[:-1]) |
+                        (s_sorted[1:] != s_sorted[:-1]))))
+    counts = np.diff(np.append(starts, len(order)))
+    # a pair of units needs at least two hits to be a match
+    multi = counts >= 2
+    starts = starts[multi]
+    ends = starts + counts[multi]
+    positions = np.column_stack((t_poses[order], s_poses[order]))
+    hits2positions = {}
+    # report unit pairs in the order in which their second hit was found
+    for i in np.argsort(order[starts + 1], kind='stable'):
+        start = starts[i]
+        hits2positions[(t_sorted[start], s_sorted[start])] = \
+            positions[start:ends[i]]
     return hits2positions
 
 
@@ -646,8 +767,6 @@ def gen_hits2positions(search, conn, target_feature_matrix, target_breaks,
     and corresponding values:
     '_id' : bson.objectid.ObjectId
         ObjectId of the Unit entity in the database
-    'index' : int
-        index of the Unit entity in the database
     'tags' : list of str
         tag information for this unit
     'forms' : list of int
@@ -667,10 +786,7 @@ def gen_hits2positions(search, conn, target_feature_matrix, target_breaks,
     """
     # keep track of mapping between matrix row index and target unit index
     # in ``target_units``
-    row2t_unit_ind = np.array([
-        u_ind for u_ind in range(len(target_breaks) - 1)
-        for _ in range(target_breaks[u_ind + 1] - target_breaks[u_ind])
-    ])
+    row2t_unit_ind = _positions_to_unit_indices(target_breaks)
     stepsize = 500
     for su_start in range(0, len(source_units), stepsize):
         search.update_current_stage_value(su_start / len(source_units))
@@ -714,8 +830,6 @@ def _gen_matches(search, conn, target_units, source_units, stoplist_set,
     and corresponding values:
     '_id' : bson.objectid.ObjectId
         ObjectId of the Unit entity in the database
-    'index' : int
-        index of the Unit entity in the database
     'tags' : list of str
         tag information for this unit
     'forms' : list of int
@@ -742,45 +856,137 @@ def _gen_matches(search, conn, target_units, source_units, stoplist_set,
                                              target_feature_matrix,
                                              target_breaks, source_units,
                                              stoplist_set, features_size):
-        overhits2positions = {
-            k: np.array(v)
-            for k, v in hits2positions.items() if len(v) >= 2
-        }
-        for (t_ind, s_ind), positions in overhits2positions.items():
+        # hits2positions only holds unit pairs with at least two hits, each
+        # already as an array
+        for (t_ind, s_ind), positions in hits2positions.items():
             yield (t_ind, s_ind, positions)
 
 
+def _make_matches(search_id, candidates, numerator_data, numerator_breaks,
+                  denominators, min_score, features, tag_helper):
+    """Score candidate matches and build the ones that score high enough
+
+    Parameters
+    ----------
+    search_id : ObjectId
+        id of the Search entity the matches belong to
+    candidates : list of tuple
+        ``(target_unit, source_unit, match_features, s_positions,
+        t_positions)`` for each candidate match, where ``match_features`` is
+        a set of plain int feature indices and the positions are the word
+        positions to highlight
+    numerator_data, numerator_breaks, denominators
+        see ``_compute_scores()`` for details; entries are in the same order
+        as ``candidates``
+    min_score : float or None
+        candidates scoring lower than this are dropped; if None, every
+        candidate is kept
+    features : list of tesserae.db.entities.Feature
+        features of the search, ordered by index
+    tag_helper : tesserae.utils.retrieve.TagHelper
+
+    Returns
+    -------
+    list of tesserae.db.entities.Match
+    """
+    if not candidates:
+        return []
+    scores = _compute_scores(numerator_data, numerator_breaks, denominators)
+    # units usually appear in many matches, so build each display tag once
+    display_tags = {}
+
+    def _get_display_tag(unit):
+        tag = display_tags.get(unit['_id'])
+        if tag is None:
+            tag = tag_helper.get_display_tag(unit['text'], unit['tags'])
+            display_tags[unit['_id']] = tag
+        return tag
+
+    return [
+        Match(search_id=search_id,
+              source_unit=source_unit['_id'],
+              target_unit=target_unit['_id'],
+              source_tag=_get_display_tag(source_unit),
+              target_tag=_get_display_tag(target_unit),
+              matched_features=[
+                  features[mf].token for mf in match_features
+              ],
+              score=score,
+              source_snippet=source_unit['snippet'],
+              target_snippet=target_unit['snippet'],
+              highlight=list(zip(s_positions.tolist(), t_positions.tolist())))
+        for (target_unit, source_unit, match_features, s_positions,
+             t_positions), score in zip(candidates, scores)
+        if min_score is None or score >= min_score
+    ]
+
+
+def _get_forms_array(units, unit_ind, cache):
+    """Get the forms of a unit as an array, converting each unit only once
+
+    A unit typically takes part in many matches, so the array built for it
+    is kept in ``cache`` for the next match it appears in.
+
+    Parameters
+    ----------
+    units : list of dict
+        see ``_get_units()`` for details
+    unit_ind : int
+        index into ``units`` of the unit whose forms are wanted
+    cache : dict[int, 1d np.array of int]
+        arrays already built, keyed by unit index
+
+    Returns
+    -------
+    1d np.array of int
+    """
+    forms = cache.get(unit_ind)
+    if forms is None:
+        forms = np.array(units[unit_ind]['forms'])
+        cache[unit_ind] = forms
+    return forms
+
+
 def _score(search, conn, target_units, source_units, features, stoplist,
            distance_basis, max_distance, source_inv_frequencies_getter,
-           target_inv_frequencies_getter, tag_helper):
-    match_ents = []
-    numerator_sparse_rows = []
-    numerator_sparse_cols = []
-    numerator_sparse_data = []
+           target_inv_frequencies_getter, tag_helper, min_score):
+    candidates = []
+    numerator_data = []
+    numerator_breaks = [0]
     denominators = []
-    stoplist_set = set(stoplist)
+    # plain ints hash and compare faster than numpy scalars
+    stoplist_set = set(np.asarray(stoplist).tolist())
     features_size = len(features)
-    search_id = search.id
+    target_forms_cache = {}
+    source_forms_cache = {}
     for target_ind, source_ind, positions in _gen_matches(
             search, conn, target_units, source_units, stoplist_set,
             features_size):
         target_unit = target_units[target_ind]
         source_unit = source_units[source_ind]
-        target_forms = np.array(target_unit['forms'])
-        source_forms = np.array(source_unit['forms'])
+        target_forms = _get_forms_array(target_units, target_ind,
+                                        target_forms_cache)
         t_positions = positions[:, 0]
         s_positions = positions[:, 1]
+        # adjacent matched words have a distance of 2, etc.
         if distance_basis == 'span':
-            # adjacent matched words have a distance of 2, etc.
             target_distance = _get_distance_by_span(t_positions, target_forms)
-            source_distance = _get_distance_by_span(s_positions, source_forms)
         else:
             target_distance = _get_distance_by_least_frequency(
                 target_inv_frequencies_getter, t_positions, target_forms)
+        # less than two matching tokens in the target unit, or too far apart
+        # for any source distance (which is at least 2) to stay in bounds
+        if target_distance <= 0 or target_distance + 2 > max_distance:
+            continue
+        source_forms = _get_forms_array(source_units, source_ind,
+                                        source_forms_cache)
+        if distance_basis == 'span':
+            source_distance = _get_distance_by_span(s_positions, source_forms)
+        else:
             source_distance = _get_distance_by_least_frequency(
                 source_inv_frequencies_getter, s_positions, source_forms)
-        if source_distance <= 0 or target_distance <= 0:
-        # less than two matching tokens in one of the units
+        if source_distance <= 0:
+        # less than two matching tokens in the source unit
             continue
         distance = source_distance + target_distance
         if distance <= max_distance:
@@ -802,52 +1008,62 @@ def _score(search, conn, target_units, source_units, features, stoplist,
                     source_inv_frequencies_getter(source_forms[pos])
                     for pos in set(s_positions)
                 ])
-                numerator_sparse_rows.extend([len(match_ents)] *
-                                            len(match_inv_frequencies))
-                numerator_sparse_cols.extend(
-                    [i for i in range(len(match_inv_frequencies))])
-                numerator_sparse_data.extend(match_inv_frequencies)
+                numerator_data.extend(match_inv_frequencies)
+                numerator_breaks.append(len(numerator_data))
                 denominators.append(distance)
-                match_ents.append(
-                    Match(search_id=search_id,
-                        source_unit=source_unit['_id'],
-                        target_unit=target_unit['_id'],
-                        source_tag=tag_helper.get_display_tag(
-                            source_unit['text'], source_unit['tags']),
-                        target_tag=tag_helper.get_display_tag(
-                            target_unit['text'], target_unit['tags']),
-                        matched_features=[
-                            features[int(mf)].token for mf in match_features
-                        ],
-                        source_snippet=source_unit['snippet'],
-                        target_snippet=target_unit['snippet'],
-                        highlight=[
-                            (int(s_pos), int(t_pos))
-                            for s_pos, t_pos in zip(s_positions, t_positions)
-                        ]))
-    if match_ents:
-        numerators = csr_matrix(
-            (numerator_sparse_data, (numerator_sparse_rows,
-                                     numerator_sparse_cols))).sum(axis=-1).A1
-        scores = np.log(numerators) - np.log(denominators)
-        for match, score in zip(match_ents, scores):
-            match.score = score
-#    print('score matrix', scores)
-#    print(match_ents)
-    return match_ents
+                candidates.append((target_unit, source_unit, match_features,
+                                   s_positions, t_positions))
+    return _make_matches(search.id, candidates, numerator_data,
+                         numerator_breaks, denominators, min_score, features,
+                         tag_helper)
     
 
+def _pair_sound_positions(target_sounds, source_sounds):
+    """Pair up the positions of sound features shared by two units
+
+    Every occurrence of a sound feature in the target is paired with every
+    occurrence of the same sound feature in the source; each side of a pair
+    records the position of the first occurrence of that sound feature in
+    its unit.
+
+    Parameters
+    ----------
+    target_sounds, source_sounds : list of int
+        the sound feature indices of a unit, in order of appearance
+
+    Returns
+    -------
+    t_positions, s_positions : 1d np.array of ints
+        the paired positions in the target and source, respectively
+    """
+    t_first = {}
+    for pos, sound in enumerate(target_sounds):
+        t_first.setdefault(sound, pos)
+    s_first = {}
+    for pos, sound in enumerate(source_sounds):
+        s_first.setdefault(sound, pos)
+    s_counts = Counter(source_sounds)
+    t_positions = []
+    s_positions = []
+    for sound in target_sounds:
+        count = s_counts.get(sound, 0)
+        if count:
+            t_positions.extend([t_first[sound]] * count)
+            s_positions.extend([s_first[sound]] * count)
+    # _get_distance_by_least_frequency expects these as 1d arrays
+    return np.array(t_positions), np.array(s_positions)
+
+
 def _score_sound(search, conn, target_units, source_units, features, stoplist,
            distance_basis, max_distance, source_inv_frequencies_getter,
-           target_inv_frequencies_getter, tag_helper):
-    match_ents = []
-    numerator_sparse_rows = []
-    numerator_sparse_cols = []
-    numerator_sparse_data = []
+           target_inv_frequencies_getter, tag_helper, min_score):
+    candidates = []
+    numerator_data = []
+    numerator_breaks = [0]
     denominators = []
-    stoplist_set = set(stoplist)
+    # plain ints hash and compare faster than numpy scalars
+    stoplist_set = set(np.asarray(stoplist).tolist())
     features_size = len(features)
-    search_id = search.id
     for target_ind, source_ind, positions in _gen_matches(
             search, conn, target_units, source_units, stoplist_set,
             features_size):
@@ -868,35 +1084,24 @@ def _score_sound(search, conn, target_units, source_units, features, stoplist,
         for a in source_unit['features']:
             for b in a:
                 source_sounds.append(b)
-        t_positions = []
-        s_positions = []
-        # append to t_positions and s_positions 
         # the positions in the text of the *matching sound features*.
         # built differently from t_positions and s_positions in _score,
         # where they record instead the positions in the text of *matching word forms*
-        for target in target_sounds:
-            for source in source_sounds:
-                if target == source:
-                    t_positions.append(target_sounds.index(target))
-                    s_positions.append(source_sounds.index(source))
-        # _get_distance_by_least_frequency expects these as 1d arrays
-        t_positions = np.array(t_positions)
-        s_positions = np.array(s_positions)
+        t_positions, s_positions = _pair_sound_positions(
+            target_sounds, source_sounds)
         target_sounds = np.array(target_sounds)
         source_sounds = np.array(source_sounds)
         # get the shortest distance of a pair of the least frequent sound features
         target_distance = _get_distance_by_least_frequency(
                 target_inv_frequencies_getter, t_positions, target_sounds)
+        # less than two matching sounds in the target unit, or too far apart
+        # for any source distance (which is at least 2) to stay in bounds
+        if target_distance <= 0 or target_distance + 2 > max_distance:
+            continue
         source_distance = _get_distance_by_least_frequency(
                 source_inv_frequencies_getter, s_positions, source_sounds)
-#            target_distance = _get_sound_distance_by_least_frequency(
-#                    target_inv_frequencies_getter, t_positions, target_sounds)
-#        print('target', target_sounds, target_distance)
-#            source_distance = _get_sound_distance_by_least_frequency(
-#                    source_inv_frequencies_getter, s_positions, source_sounds)
-#        print('source', source_sounds, source_distance)
-        if source_distance <= 0 or target_distance <= 0:
-        # less than two matching tokens in one of the units
+        if source_distance <= 0:
+        # less than two matching sounds in the source unit
             continue
         # distance is both used to compare to max_distance below 
         # and will become the denominator in the scoring formula
@@ -907,12 +1112,10 @@ def _score_sound(search, conn, target_units, source_units, features, stoplist,
             # now we are once again interested in 
             # not just the least frequent sound features, 
             # but in all the matching sound features
-            target_features = target_unit['features']
-            source_features = source_unit['features']
             match_features = set(
                 itertools.chain.from_iterable([
-                    set(target_sounds).intersection(
-                        set(source_sounds))
+                    set(target_sounds.tolist()).intersection(
+                        source_sounds.tolist())
                 ]))
             match_features -= stoplist_set
             if match_features:
@@ -924,56 +1127,15 @@ def _score_sound(search, conn, target_units, source_units, features, stoplist,
                     source_inv_frequencies_getter(source_sounds[pos])
                     for pos in s_positions
                 ])
-                numerator_sparse_rows.extend([len(match_ents)] *
-                                            len(match_inv_frequencies))
-                numerator_sparse_cols.extend(
-                    [i for i in range(len(match_inv_frequencies))])
-                numerator_sparse_data.extend(match_inv_frequencies)
+                numerator_data.extend(match_inv_frequencies)
+                numerator_breaks.append(len(numerator_data))
                 denominators.append(distance)
-                # match_ents.highlight is not the positions of sound features
+                # the highlight is not the positions of sound features
                 # in a line, but the positions of the words to which they belong
-                match_ents.append(
-                    Match(search_id=search_id,
-                        source_unit=source_unit['_id'],
-                        target_unit=target_unit['_id'],
-                        source_tag=tag_helper.get_display_tag(
-                            source_unit['text'], source_unit['tags']),
-                        target_tag=tag_helper.get_display_tag(
-                            target_unit['text'], target_unit['tags']),
-                        matched_features=[
-                            features[int(mf)].token for mf in match_features
-                        ],
-                        source_snippet=source_unit['snippet'],
-                        target_snippet=target_unit['snippet'],
-                        highlight=[
-                            (int(s_pos), int(t_pos))
-                            for s_pos, t_pos in zip(s_word_pos, t_word_pos)
-                        ]))
-                #in this version match_ents.highlight is an *array* of positions
-#               match_ents.append(
-#                    Match(search_id=search_id,
-#                        source_unit=source_unit['_id'],
-#                        target_unit=target_unit['_id'],
-#                        source_tag=tag_helper.get_display_tag(
-#                            source_unit['text'], source_unit['tags']),
-#                        target_tag=tag_helper.get_display_tag(
-#                            target_unit['text'], target_unit['tags']),
-#                        matched_features=[
-#                            features[int(mf)].token for mf in match_features
-#                        ],
-#                        source_snippet=source_unit['snippet'],
-#                        target_snippet=target_unit['snippet'],
-#                        highlight=positions
-#                    ))
-    if match_ents:
-        numerators = csr_matrix(
-            (numerator_sparse_data, (numerator_sparse_rows,
-                                     numerator_sparse_cols))).sum(axis=-1).A1
-        scores = np.log(numerators) - np.log(denominators)
-        for match, score in zip(match_ents, scores):
-            match.score = score
-#    print('score matrix', scores)
-#    print(match_ents)
-    return match_ents
+                candidates.append((target_unit, source_unit, match_features,
+                                   s_word_pos, t_word_pos))
+    return _make_matches(search.id, candidates, numerator_data,
+                         numerator_breaks, denominators, min_score, features,
+                         tag_helper)
     
     
@@ -5,6 +5,9 @@ from scipy.sparse import csr_matrix
 
 from tesserae.db.entities import Feature, Unit
 
+# features fetched per round trip when aggregating corpus frequencies
+_FEATURE_BATCH_SIZE = 10000
+
 
 def get_corpus_frequencies(connection, feature, language):
     """Get frequency data for a given feature across a particular corpus
@@ -63,10 +66,13 @@ def get_corpus_frequencies(connection, feature, language):
     ]
 
     freqs = connection.aggregate(
-            Feature.collection, pipeline, encode=False)
-    freqs = list(freqs)
-    freqs = np.array([freq['frequency'] for freq in freqs])
-    return freqs / sum(freqs)
+            Feature.collection,
+            pipeline,
+            encode=False,
+            batch_size=_FEATURE_BATCH_SIZE)
+    freqs = np.fromiter((freq['frequency'] for freq in freqs),
+                        dtype=np.float64)
+    return freqs / freqs.sum()
 
 
 def get_feature_counts_by_text(connection, feature, text):
@@ -135,7 +141,7 @@ def get_feature_counts_by_text(connection, feature, text):
         csr_cols.append(mfindex)
     word_feature_matrix = csr_matrix(
         (
-            np.ones(len(csr_rows), dtype=np.bool),
+            np.ones(len(csr_rows), dtype=np.bool_),
             (np.array(csr_rows), np.array(csr_cols))
         ),
         shape=(len(tindex2mtindex), len(findex2mfindex))
@@ -245,7 +251,7 @@ def get_inverse_text_frequencies(connection, feature, text_id):
         csr_cols.append(mfindex)
     word_feature_matrix = csr_matrix(
         (
-            np.ones(len(csr_rows), dtype=np.bool),
+            np.ones(len(csr_rows), dtype=np.bool_),
             (np.array(csr_rows), np.array(csr_cols))
         ),
         shape=(len(tindex2mtindex), len(findex2mfindex))
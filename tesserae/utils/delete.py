@@ -8,6 +8,7 @@ from tesserae.utils.downloads import ResultsWriter, get_results_filename
 from tesserae.utils.multitext import (MULTITEXT_SEARCH, BigramWriter,
                                       unregister_bigrams)
 from tesserae.utils.search import NORMAL_SEARCH
+from tesserae.utils.stopwords import clear_stoplist_cache
 
 
 def remove_results(connection, searches):
@@ -102,6 +103,7 @@ def remove_text(connection, text):
         }}, {'$unset': {
             'frequencies.' + str_text_id: ""
         }})
+    clear_stoplist_cache(connection, text.language)
 
     unregister_bigrams(connection, text)
 
@@ -12,6 +12,7 @@ from tesserae.utils.coordinate import JobQueue
 from tesserae.utils.delete import remove_text
 from tesserae.utils.multitext import register_bigrams, MULTITEXT_SEARCH
 from tesserae.utils.search import NORMAL_SEARCH
+from tesserae.utils.stopwords import clear_stoplist_cache
 from tesserae.utils.tessfile import TessFile
 
 
@@ -176,6 +177,7 @@ def _ingest_tessfile(connection, text, tessfile, enable_multitext=False):
             features_for_update.append(f)
     connection.insert(features_for_insert)
     connection.update(features_for_update)
+    clear_stoplist_cache(connection, text.language)
 
     unitizer = Unitizer()
     lines, phrases = unitizer.unitize(tokens, tags, tessfile.metadata)
@@ -397,6 +399,7 @@ def _update_features(connection, text, feature, tokens,
             form_oid_to_raw_features)
     connection.insert([f for f in token_to_features_for_insert.values()])
     connection.update([f for f in token_to_features_for_update.values()])
+    clear_stoplist_cache(connection, text.language)
     expected_size = len(token_to_features_for_insert) + \
         len(db_feature_cache)
     wait_limit = 20
@@ -3,6 +3,7 @@ from collections import defaultdict
 import datetime
 import glob
 import itertools
+import math
 import os
 import sqlite3
 import time
@@ -149,9 +150,14 @@ def compute_tesserae_score(inverse_frequencies, distances):
     Returns
     -------
     float
+        negative infinity if the inverse frequencies sum to zero, as happens
+        when the forms of a bigram are missing from the text frequencies
 
     """
-    return np.log(sum(inverse_frequencies) / sum(distances))
+    total_inverse_frequency = sum(inverse_frequencies)
+    if not total_inverse_frequency:
+        return -math.inf
+    return math.log(total_inverse_frequency / sum(distances))
 
 
 def compute_inverse_frequencies(connection, feature_type, text_id):
@@ -607,6 +613,12 @@ def get_results(connection, search_id, page_options):
                                              id_to_needed_units.values())
     str_match_id_to_multiresults = _get_str_match_id_to_multiresults(
         raw_multiresults)
+    # the same units show up in many cross-references, so stringify their ids
+    # and build their tags only once
+    id_to_unit_strs = {
+        uid: (str(uid), tag_helper.get_display_tag(u.text, u.tags))
+        for uid, u in id_to_needed_units.items()
+    }
     return [
         {
             'match':
@@ -618,15 +630,13 @@ def get_results(connection, search_id, page_options):
                     mr['bigram'],
                     'units': [
                         {
-                            'unit_id': str(u.id),
-                            'tag': tag_helper.get_display_tag(u.text, u.tags),
-                            'snippet': u.snippet,
+                            'unit_id': id_to_unit_strs[uid][0],
+                            'tag': id_to_unit_strs[uid][1],
+                            'snippet': id_to_needed_units[uid].snippet,
                             # TODO implement
                             'highlight': [],
                             'score': score
-                        } for u, score in zip((
-                            id_to_needed_units[uid]
-                            for uid in mr['units']), mr['scores'])
+                        } for uid, score in zip(mr['units'], mr['scores'])
                     ]
                 } for mr in str_match_id_to_multiresults[match['object_id']]
             ]
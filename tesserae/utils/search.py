@@ -1,5 +1,6 @@
 """Helper functions for running Tesserae search"""
 import datetime
+from operator import attrgetter
 import time
 import traceback
 
@@ -69,7 +70,7 @@ def _run_search(connection, results_status, matcher_type, search_params):
         results_status.add_new_stage('match and score')
         connection.update(results_status)
         matches = matcher.match(results_status, **search_params)
-        matches.sort(key=lambda m: m.score, reverse=True)
+        matches.sort(key=attrgetter('score'), reverse=True)
         results_status.update_current_stage_value(1.0)
 
         results_status.add_new_stage('save results')
@@ -77,7 +78,8 @@ def _run_search(connection, results_status, matcher_type, search_params):
         stepsize = 5000
         source = search_params['source'].text
         target = search_params['target'].text
-        max_score = matches[0].score
+        # matches are sorted, so the first one has the highest score
+        max_score = matches[0].score if matches else 0.0
         with ResultsWriter(results_status, source, target,
                            max_score) as writer:
             for start in range(0, len(matches), stepsize):
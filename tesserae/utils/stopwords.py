@@ -1,8 +1,19 @@
 """Functions for interfacing stopwords with database information"""
+import datetime
+import hashlib
+import json
+
 import numpy as np
 
 from tesserae.db.entities import Entity, Feature
 
+# stoplists computed by create_stoplist(), keyed by their parameters
+STOPLIST_CACHE_COLLECTION = 'stoplist_cache'
+# per-language counters bumped by clear_stoplist_cache(); the '*' entry is
+# bumped when all languages are cleared
+STOPLIST_GENERATION_COLLECTION = 'stoplist_cache_generations'
+_ALL_LANGUAGES = '*'
+
 
 def get_feature_indices(conn, language, feature_type, stopwords):
     """Retrieve Feature indicies for specified stopwords
@@ -44,6 +55,12 @@ def get_feature_indices(conn, language, feature_type, stopwords):
 def create_stoplist(connection, n, feature, language, basis='corpus'):
     """Compute a stoplist of `n` tokens.
 
+    Results are cached in the database, so repeated requests for the same
+    stoplist skip the aggregation over all features; see
+    ``clear_stoplist_cache()``. The cache key includes the cache generation
+    read before the aggregation, so a stoplist computed while the cache is
+    being cleared is never served afterwards, nor left behind in the cache.
+
     Parameters
     ----------
     connection : tesserae.db.TessMongoConnection
@@ -62,6 +79,15 @@ def create_stoplist(connection, n, feature, language, basis='corpus'):
     stoplist : 1d np.array of np.unit32
         The `n` most frequent tokens in the basis texts.
     """
+    if basis != 'corpus':
+        basis = [t.id if isinstance(t, Entity) else t for t in basis]
+    generation = _get_stoplist_generation(connection, language)
+    cache_key = _stoplist_cache_key(n, feature, language, basis, generation)
+    cache = connection.connection[STOPLIST_CACHE_COLLECTION]
+    cached = cache.find_one({'_id': cache_key})
+    if cached is not None:
+        return np.array(cached['stoplist'], dtype=np.uint32)
+
     pipeline = [
         {
             '$match': {
@@ -76,7 +102,6 @@ def create_stoplist(connection, n, feature, language, basis='corpus'):
             '$project': {
                 '_id': False,
                 'index': True,
-                'token': True,
                 'frequency': {
                     '$reduce': {
                         'input': {
@@ -91,12 +116,10 @@ def create_stoplist(connection, n, feature, language, basis='corpus'):
             }
         })
     else:
-        basis = [t.id if isinstance(t, Entity) else t for t in basis]
         pipeline.extend([{
             '$project': {
                 '_id': False,
                 'index': True,
-                'token': True,
                 'frequency': {
                     '$sum': ['$frequencies.' + str(t_id) for t_id in basis]
                 }
@@ -111,15 +134,93 @@ def create_stoplist(connection, n, feature, language, basis='corpus'):
         '$limit': n
     }, {
         '$project': {
-            'token': True,
-            'index': True,
-            'frequency': True
+            'index': True
         }
     }])
 
     stoplist = connection.aggregate(Feature.collection, pipeline, encode=False)
-    stoplist = list(stoplist)
-    return np.array([s['index'] for s in stoplist], dtype=np.uint32)
+    stoplist = np.fromiter((s['index'] for s in stoplist), dtype=np.uint32)
+    # a concurrent clear bumps the generation, which leaves this entry
+    # unreachable instead of letting it overwrite fresher results
+    cache.update_one({'_id': cache_key}, {
+        '$setOnInsert': {
+            'language': language,
+            'stoplist': stoplist.tolist(),
+            'created': datetime.datetime.utcnow()
+        }
+    }, upsert=True)
+    # if that clear already deleted the cache, it missed this entry, so take
+    # it back out; a clear that bumps the generation after this check will
+    # delete the entry itself
+    if _get_stoplist_generation(connection, language) != generation:
+        cache.delete_one({'_id': cache_key})
+    return stoplist
+
+
+def _get_stoplist_generation(connection, language):
+    """Read the stoplist cache generation that applies to a language
+
+    Parameters
+    ----------
+    connection : tesserae.db.TessMongoConnection
+    language : str
+
+    Returns
+    -------
+    list of int
+        the generation of the whole cache followed by that of ``language``
+    """
+    counters = {
+        doc['_id']: doc['generation']
+        for doc in connection.connection[STOPLIST_GENERATION_COLLECTION].find(
+            {'_id': {'$in': [_ALL_LANGUAGES, language]}})
+    }
+    return [counters.get(_ALL_LANGUAGES, 0), counters.get(language, 0)]
+
+
+def _stoplist_cache_key(n, feature, language, basis, generation):
+    """Identify a stoplist computation for the stoplist cache
+
+    Parameters
+    ----------
+    n : int
+    feature : str
+    language : str
+    basis : list of ObjectId or 'corpus'
+        See ``create_stoplist()`` for details
+    generation : list of int
+        See ``_get_stoplist_generation()``
+
+    Returns
+    -------
+    str
+    """
+    if basis != 'corpus':
+        basis = sorted(str(t_id) for t_id in basis)
+    return hashlib.sha1(
+        json.dumps([language, feature, basis, int(n),
+                    generation]).encode('utf-8')).hexdigest()
+
+
+def clear_stoplist_cache(connection, language=None):
+    """Forget stoplists computed by ``create_stoplist()``
+
+    This must be called whenever feature frequencies change, since cached
+    stoplists were computed from the frequencies at the time.
+
+    Parameters
+    ----------
+    connection : tesserae.db.TessMongoConnection
+    language : str, optional
+        If given, only forget stoplists for this language
+    """
+    # bump the generation first, so that stoplists still being computed
+    # from the old frequencies are stored under keys nobody looks up again
+    connection.connection[STOPLIST_GENERATION_COLLECTION].update_one(
+        {'_id': _ALL_LANGUAGES if language is None else language},
+        {'$inc': {'generation': 1}}, upsert=True)
+    query = {} if language is None else {'language': language}
+    connection.connection[STOPLIST_CACHE_COLLECTION].delete_many(query)
 
 
 def get_stoplist_indices(connection, stopwords, feature=None, language=None):
@@ -221,6 +221,12 @@ def test_create_filter(request):
                          '$gt': datetime.datetime(1984, 1, 1),
                          '$exists': True}}
 
+    # Test that modifying a returned filter does not affect later filters
+    f = conn.create_filter(foo=['bar'])
+    f['foo']['$in'].append('baz')
+    f = conn.create_filter(foo=['bar'])
+    assert f == {'foo': {'$in': ['bar'], '$exists': True}}
+
 
 def test_insert(request, test_data, depopulate):
     conf = request.config
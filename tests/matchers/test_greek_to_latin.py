@@ -1,6 +1,7 @@
 import math
 import uuid
 
+import numpy as np
 import pytest
 
 from tesserae.data import load_greek_to_latin
@@ -8,7 +9,9 @@ from tesserae.db import Feature, Search, Text, \
                         TessMongoConnection
 from tesserae.matchers import GreekToLatinSearch
 from tesserae.matchers.greek_to_latin import \
-    _build_greek_ind_to_other_greek_inds, _get_greek_to_latin_inv_freqs_by_text
+    _build_greek_ind_to_other_greek_inds, \
+    _get_greek_to_latin_inv_freqs_by_text, _inv_freqs_to_array, \
+    _lookup_inv_freqs
 from tesserae.matchers.sparse_encoding import _get_units
 from tesserae.matchers.text_options import TextOptions
 from tesserae.utils import ingest_text
@@ -25,6 +28,21 @@ def g2lpop(request, mini_g2l_metadata):
     obliterate(conn)
 
 
+def test_lookup_inv_freqs():
+    inv_freqs = _inv_freqs_to_array({0: 2.0, 1: 0.5, 3: 4.0})
+    assert _lookup_inv_freqs(inv_freqs, np.array([3, 0, 3])).tolist() == \
+        [4.0, 2.0, 4.0]
+    # a form between the known ones
+    with pytest.raises(KeyError):
+        _lookup_inv_freqs(inv_freqs, np.array([0, 2]))
+    # a form past the known ones
+    with pytest.raises(KeyError):
+        _lookup_inv_freqs(inv_freqs, np.array([4]))
+    # padding must not wrap around to the last form
+    with pytest.raises(KeyError):
+        _lookup_inv_freqs(inv_freqs, np.array([1, -1]))
+
+
 def test_greek_to_latin_inv_freq_by_text(g2lpop, v3checker):
     greek_to_latin = load_greek_to_latin()
     greek_ind_to_other_greek_inds = _build_greek_ind_to_other_greek_inds(
@@ -2,8 +2,11 @@ import uuid
 
 import numpy as np
 import pytest
+from scipy.sparse import coo_matrix
 from tesserae.db import Feature, Search, TessMongoConnection, Text
-from tesserae.matchers.sparse_encoding import SparseMatrixSearch, _get_units
+from tesserae.matchers.sparse_encoding import SparseMatrixSearch, \
+    _bin_hits_to_unit_indices, _get_distance_by_least_frequency, _get_units, \
+    _inverse_averaged_freqs, _pair_sound_positions, _position_rows_to_csr
 from tesserae.matchers.text_options import TextOptions
 from tesserae.tokenizers import LatinTokenizer
 from tesserae.unitizer import Unitizer
@@ -24,6 +27,78 @@ def punctpop(request, mini_punctuation_metadata):
     obliterate(conn)
 
 
+def test_bin_hits_to_unit_indices():
+    # two target units of lengths 2 and 1; two source units of lengths 1 and 2
+    target_breaks = np.array([0, 2, 3])
+    source_breaks = np.array([0, 1, 3])
+    row2t_unit_ind = np.array([0, 0, 1])
+    rows = np.array([0, 0, 1, 1, 2, 2])
+    cols = np.array([0, 2, 1, 2, 0, 2])
+    hits2positions = _bin_hits_to_unit_indices(rows, cols, row2t_unit_ind,
+                                               target_breaks, source_breaks,
+                                               10)
+    # only the pair (target 0, source 1) was hit more than once
+    assert list(hits2positions.keys()) == [(0, 11)]
+    assert np.array_equal(hits2positions[(0, 11)],
+                          np.array([[0, 1], [1, 0], [1, 1]]))
+
+
+def test_pair_sound_positions():
+    t_positions, s_positions = _pair_sound_positions([4, 7, 4], [7, 4, 4, 9])
+    # each shared sound is paired by its first position in either unit
+    assert t_positions.tolist() == [0, 0, 1, 0, 0]
+    assert s_positions.tolist() == [1, 1, 0, 1, 1]
+
+
+def test_inverse_averaged_freqs():
+    freqs = {0: 0.25, 1: 0.75, 2: 0.0, 3: 0.0}
+    units = [{'forms': [10, 11, 12], 'features': [[0, 1], [2, 3], []]}]
+    inv_freqs = _inverse_averaged_freqs(freqs, units)
+    assert inv_freqs[10] == 2.0
+    # features that never occur are infinitely rare, as 1 / mean would say
+    assert inv_freqs[11] == np.inf
+    # a form without features has no average
+    assert np.isnan(inv_freqs[12])
+
+
+def test_position_rows_to_csr_matches_coo():
+    # rows are sorted, but columns within a row are unsorted and repeated
+    pos_inds = np.array([0, 0, 0, 2, 2, 3, 3, 3])
+    col_inds = np.array([4, 1, 4, 3, 0, 2, 2, 1])
+    shape = (5, 6)
+    expected = coo_matrix(
+        (np.ones(len(pos_inds), dtype=np.bool_), (pos_inds, col_inds)),
+        shape=shape).tocsr()
+    m = _position_rows_to_csr(pos_inds, col_inds, shape)
+    assert m.has_canonical_format
+    assert np.array_equal(m.indptr, expected.indptr)
+    assert np.array_equal(m.indices, expected.indices)
+    assert np.array_equal(m.data, expected.data)
+    # hits come out of a product in the same order
+    other = coo_matrix(
+        (np.ones(5, dtype=np.bool_),
+         (np.array([3, 1, 4, 0, 2]), np.array([0, 0, 1, 1, 1]))),
+        shape=(6, 2)).tocsc()
+    hits = m.dot(other).tocoo()
+    expected_hits = expected.dot(other).tocoo()
+    assert hits.row.tolist() == expected_hits.row.tolist()
+    assert hits.col.tolist() == expected_hits.col.tolist()
+
+
+def test_distance_by_least_frequency_ties():
+    forms = np.arange(8)
+    inv_freqs = np.array([5.0, 9.0, 5.0, 2.0, 5.0, 1.0, 5.0, 2.0])
+    # ties for the rarest word go to the earliest positions
+    assert _get_distance_by_least_frequency(
+        inv_freqs, np.array([6, 0, 4]), forms) == 5
+    # as do ties for the second rarest word
+    assert _get_distance_by_least_frequency(
+        inv_freqs, np.array([7, 1, 3]), forms) == 3
+    # the getter form resolves ties the same way
+    assert _get_distance_by_least_frequency(
+        lambda form: inv_freqs[form], np.array([7, 1, 3]), forms) == 3
+
+
 def test_mini_latin_search_text_freqs(minipop, mini_latin_metadata, v3checker):
     texts = minipop.find(Text.collection,
                          title=[m['title'] for m in mini_latin_metadata])
@@ -3,6 +3,8 @@ import pytest
 from tesserae.db import TessMongoConnection
 from tesserae.db.entities import Feature, Text, Token, Unit
 from tesserae.utils import ingest_text, remove_text
+from tesserae.utils.stopwords import STOPLIST_CACHE_COLLECTION, \
+    create_stoplist
 
 
 @pytest.fixture
@@ -33,3 +35,19 @@ def test_remove(removedb, mini_latin_metadata):
 
     features = removedb.find(Feature.collection)
     assert all([str(text_id) not in f.frequencies for f in features])
+
+
+def test_remove_clears_stoplist_cache(removedb, mini_latin_metadata):
+    texts = removedb.find(
+        Text.collection,
+        title=[m['title'] for m in mini_latin_metadata]
+    )
+    cache = removedb.connection[STOPLIST_CACHE_COLLECTION]
+
+    stoplist = create_stoplist(removedb, 10, 'form', texts[0].language)
+    assert cache.count_documents({}) == 1
+    cached = create_stoplist(removedb, 10, 'form', texts[0].language)
+    assert list(cached) == list(stoplist)
+
+    remove_text(removedb, texts[0])
+    assert cache.count_documents({}) == 0
@@ -1,10 +1,12 @@
 import itertools
+import math
 import uuid
 
 from tesserae.db.entities import Search, Text
 from tesserae.matchers.sparse_encoding import SparseMatrixSearch
 from tesserae.matchers.text_options import TextOptions
-from tesserae.utils.multitext import multitext_search
+from tesserae.utils.multitext import compute_tesserae_score, \
+    multitext_search
 
 
 def test_latin_multitext_search(minipop):
@@ -86,3 +88,10 @@ def test_greek_multitext_search(minipop):
         assert len(bigrams) == len(r)
         for bigram in bigrams:
             assert bigram in r
+
+
+def test_compute_tesserae_score():
+    assert math.isclose(compute_tesserae_score([2.0, 4.0], [1, 2]),
+                        math.log(2.0))
+    # forms missing from the text frequencies contribute zero
+    assert compute_tesserae_score([0.0, 0.0], [1, 2]) == -math.inf
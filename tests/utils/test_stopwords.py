@@ -0,0 +1,77 @@
+import pytest
+
+from tesserae.db import TessMongoConnection
+from tesserae.db.entities import Text
+from tesserae.utils import ingest_text
+from tesserae.utils.stopwords import STOPLIST_CACHE_COLLECTION, \
+    clear_stoplist_cache, create_stoplist
+
+
+@pytest.fixture
+def stopdb(mini_latin_metadata):
+    conn = TessMongoConnection('localhost', 27017, None, None, 'stopdb')
+    for metadata in mini_latin_metadata:
+        text = Text.json_decode(metadata)
+        ingest_text(conn, text)
+    yield conn
+    for coll_name in conn.connection.list_collection_names():
+        conn.connection.drop_collection(coll_name)
+
+
+def test_stoplist_cache_keyed_by_basis_and_n(stopdb):
+    texts = stopdb.find(Text.collection, language='latin')
+    cache = stopdb.connection[STOPLIST_CACHE_COLLECTION]
+
+    corpus_10 = create_stoplist(stopdb, 10, 'form', 'latin')
+    corpus_5 = create_stoplist(stopdb, 5, 'form', 'latin')
+    text_10 = create_stoplist(stopdb, 10, 'form', 'latin', basis=[texts[0]])
+    assert cache.count_documents({}) == 3
+    assert len(corpus_10) == 10
+    assert len(corpus_5) == 5
+
+    assert list(create_stoplist(stopdb, 5, 'form', 'latin')) == \
+        list(corpus_5)
+    assert list(create_stoplist(
+        stopdb, 10, 'form', 'latin', basis=[texts[0].id])) == list(text_10)
+    assert cache.count_documents({}) == 3
+
+
+def test_stoplist_cache_ignores_writes_from_before_clear(stopdb):
+    aggregate = stopdb.aggregate
+    calls = []
+
+    def clear_during_aggregate(*args, **kwargs):
+        # an ingest clears the cache while the stoplist is being computed
+        if not calls:
+            clear_stoplist_cache(stopdb, 'latin')
+        calls.append(args)
+        return aggregate(*args, **kwargs)
+
+    stopdb.aggregate = clear_during_aggregate
+    create_stoplist(stopdb, 10, 'form', 'latin')
+    assert len(calls) == 1
+    # the stoplist computed before the clear must not be served
+    create_stoplist(stopdb, 10, 'form', 'latin')
+    assert len(calls) == 2
+    # but the one computed afterwards is
+    create_stoplist(stopdb, 10, 'form', 'latin')
+    assert len(calls) == 2
+
+
+def test_stoplist_cache_drops_writes_from_before_clear(stopdb):
+    aggregate = stopdb.aggregate
+    cache = stopdb.connection[STOPLIST_CACHE_COLLECTION]
+
+    def clear_during_aggregate(*args, **kwargs):
+        # the cache is cleared after this stoplist has missed it
+        clear_stoplist_cache(stopdb, 'latin')
+        return aggregate(*args, **kwargs)
+
+    stopdb.aggregate = clear_during_aggregate
+    create_stoplist(stopdb, 10, 'form', 'latin')
+    # the stoplist computed from the old frequencies is not left behind
+    assert cache.count_documents({}) == 0
+
+    stopdb.aggregate = aggregate
+    create_stoplist(stopdb, 10, 'form', 'latin')
+    assert cache.count_documents({}) == 1